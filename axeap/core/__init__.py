@@ -23,12 +23,15 @@ from .roi import (
 
 from .roifinding import (
     calcHROIs,
+    calcHROIsBatch,
     calcHorizontalLineSegments,
-    calcVROIs
+    calcVROIs,
+    calcVROIsBatch
 )
 
 from .spectra import (
     calcSpectra,
+    calcSpectraBatch,
     Spectra,
     SpectraSet
 )
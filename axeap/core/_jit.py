@@ -0,0 +1,65 @@
+'''Optional Numba support.
+
+Numba is not required to use axeap. If it is installed, the decorators here
+compile functions to machine code; otherwise they return the function
+unchanged so it runs as ordinary Python.
+
+Numba itself is only imported once one of the decorators or :obj:`prange` is
+used. Importing Numba is slow, so modules of compiled kernels should in turn
+only be imported when the kernels are first needed.
+'''
+
+import threading
+import importlib.util
+
+HAVE_NUMBA = importlib.util.find_spec('numba') is not None
+"""Whether Numba is available."""
+
+
+def _numba():
+    import numba
+    return numba
+
+
+def njit(*args, **kwargs):
+    """Compile function with :obj:`numba.njit` if Numba is installed.
+
+    Can be used both as ``@njit`` and as ``@njit(cache=True)``.
+    """
+    if HAVE_NUMBA:
+        return _numba().njit(*args, **kwargs)
+    if len(args) == 1 and callable(args[0]) and not kwargs:
+        return args[0]
+    return lambda f: f
+
+
+def __getattr__(name):
+    # Parallel loop range for functions compiled with ``parallel=True``.
+    # Without Numba loops run serially.
+    if name == 'prange':
+        return _numba().prange if HAVE_NUMBA else range
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def get_num_threads():
+    """Number of threads Numba runs parallel loops with, 1 without Numba."""
+    return _numba().get_num_threads() if HAVE_NUMBA else 1
+
+
+parallel_lock = threading.Lock()
+"""Lock to hold while calling functions compiled with ``parallel=True`` or
+``target='parallel'``. Numba's parallel regions must not be entered from more
+than one Python thread at a time with some threading layers, which abort the
+process if they are."""
+
+
+def guvectorize(ftylist, signature, **kwargs):
+    """Create generalized ufunc with :obj:`numba.guvectorize` if Numba is
+    installed.
+
+    Without Numba the function is returned unchanged, so callers must check
+    :obj:`HAVE_NUMBA` and loop over the inputs themselves.
+    """
+    if HAVE_NUMBA:
+        return _numba().guvectorize(ftylist, signature, **kwargs)
+    return lambda f: f
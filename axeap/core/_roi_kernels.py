@@ -0,0 +1,50 @@
+'''Compiled kernels used for finding regions of interest.
+
+See :obj:`._jit` for how these behave when Numba is not installed.
+'''
+
+import numpy as np
+
+from ._jit import njit
+
+
+@njit(cache=True)
+def _merge_lines(flats, min_overlap):
+    """Merge overlapping spans in a single sweep.
+
+    Parameters
+    ----------
+    flats : :obj:`numpy.ndarray`
+        Array of shape (N,2) of spans in form [x1,x2], sorted by x1. Must not
+        be empty.
+    min_overlap : :obj:`float`
+        Spans are merged if they overlap by more than this fraction of the
+        length of the shorter of the two.
+
+    Returns
+    -------
+    :obj:`tuple`
+        Arrays of low and high ends of merged spans.
+    """
+    n = flats.shape[0]
+    los = np.empty(n)
+    his = np.empty(n)
+    k = 0
+    lo = flats[0,0]
+    hi = flats[0,1]
+    for i in range(1, n):
+        nlo = flats[i,0]
+        nhi = flats[i,1]
+        overlaplen = min(hi, nhi) - max(lo, nlo)
+        if overlaplen > min_overlap*min(hi-lo, nhi-nlo):
+            hi = max(hi, nhi)
+        else:
+            los[k] = lo
+            his[k] = hi
+            k += 1
+            lo = nlo
+            hi = nhi
+    los[k] = lo
+    his[k] = hi
+    k += 1
+    return los[:k], his[:k]
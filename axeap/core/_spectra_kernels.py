@@ -0,0 +1,106 @@
+'''Compiled kernels used for calculating spectra.
+
+Only used by :obj:`.spectra.calcSpectra` when Numba is installed, see
+:obj:`._jit`.
+'''
+
+import functools
+import numpy as np
+
+from ._jit import njit, prange, guvectorize
+
+
+@njit(cache=True, parallel=True, nogil=True)
+def _accumulate(emap, image, minenergy, inv_res, nbins, nthreads):
+    """Sum intensity of each pixel into bin of nearest energy.
+
+    Pixels past the last bin are added to the last bin.
+
+    Parameters
+    ----------
+    emap : :obj:`numpy.ndarray`
+        2D array of energy values. Pixels with energy of 0 or less are skipped.
+    image : :obj:`numpy.ndarray`
+        2D array of intensity values, same size as emap.
+    minenergy : :obj:`float`
+        Energy of first bin.
+    inv_res : :obj:`float`
+        Inverse of width of bins in eV.
+    nbins : :obj:`int`
+        Number of bins.
+    nthreads : :obj:`int`
+        Number of threads to split rows between, normally
+        :obj:`._jit.get_num_threads`. Passed in rather than looked up so the
+        compiled function can be cached.
+
+    Returns
+    -------
+    :obj:`numpy.ndarray`
+        Summed intensity in each bin.
+    """
+    # Rows are split into one chunk per thread, each with its own histogram
+    nchunks = max(1, min(nthreads, emap.shape[0]))
+    rows = (emap.shape[0]+nchunks-1)//nchunks
+    local = np.zeros((nchunks, nbins))
+    for c in prange(nchunks):
+        for x in range(c*rows, min((c+1)*rows, emap.shape[0])):
+            for y in range(emap.shape[1]):
+                energy = emap[x,y]
+                if energy <= 0: continue
+                i = min(int(np.rint((energy-minenergy)*inv_res)), nbins-1)
+                local[c,i] += image[x,y]
+    return local.sum(axis=0)
+
+
+@njit(cache=True, parallel=True, nogil=True)
+def _accumulate_masked(emap, image, mask, minenergy, inv_res, nbins, nthreads):
+    """Same as :obj:`_accumulate` but skipping pixels where mask is non-zero.
+
+    ``mask`` is a 2D :obj:`numpy.uint8` array, same size as emap.
+    """
+    nchunks = max(1, min(nthreads, emap.shape[0]))
+    rows = (emap.shape[0]+nchunks-1)//nchunks
+    local = np.zeros((nchunks, nbins))
+    for c in prange(nchunks):
+        for x in range(c*rows, min((c+1)*rows, emap.shape[0])):
+            for y in range(emap.shape[1]):
+                energy = emap[x,y]
+                if energy <= 0 or mask[x,y]: continue
+                i = min(int(np.rint((energy-minenergy)*inv_res)), nbins-1)
+                local[c,i] += image[x,y]
+    return local.sum(axis=0)
+
+
+def _accumulate_image(emap, image, energies, inv_res, intensities):
+    """Core of :obj:`_get_accumulate_batch`, bins a single image.
+
+    Bins are given by ``energies``, which must be evenly spaced by
+    ``1/inv_res``. The sums are written to ``intensities``.
+    """
+    intensities[:] = 0
+    nbins = intensities.shape[0]
+    minenergy = energies[0]
+    for x in range(emap.shape[0]):
+        for y in range(emap.shape[1]):
+            energy = emap[x,y]
+            if energy <= 0: continue
+            i = min(int(np.rint((energy-minenergy)*inv_res)), nbins-1)
+            intensities[i] += image[x,y]
+
+
+@functools.lru_cache(maxsize=None)
+def _get_accumulate_batch():
+    """Get generalized ufunc version of :obj:`_accumulate`, for stacks of
+    images.
+
+    The gufunc is parallelized over the images rather than within each one,
+    and is called as ``(emap, images, energies, inv_res)``. Creating it with
+    type signatures compiles it straight away and starts Numba's threading
+    layer, which makes forking the process afterwards unsafe, so it is only
+    created when first needed rather than on import.
+    """
+    return guvectorize(
+        ['void(float32[:,:], float32[:,:], float32[:], float32, float64[:])',
+        'void(float64[:,:], float64[:,:], float64[:], float64, float64[:])'],
+        '(n,m),(n,m),(k),()->(k)', target='parallel', cache=True,
+        )(_accumulate_image)
@@ -7,9 +7,8 @@ corresponding to the energy of the pixel.
 """
 
 import numpy as np
-from scipy import interpolate
-from scipy.optimize import curve_fit
-import random
+import functools
+import multiprocessing
 from pathlib import Path
 
 from .scan import Scan, ScanSet
@@ -18,6 +17,7 @@ from .spectra import Spectra, calcSpectra
 from .roi import HROI
 from ..utils import *
 from .conventions import X, Y
+from ._jit import HAVE_NUMBA, guvectorize
 
 class EnergyMap(DataItem, Saveable, Loadable):
     """
@@ -25,9 +25,9 @@ class EnergyMap(DataItem, Saveable, Loadable):
     """
 
     TYPE_NAME = "EnergyMap"
-    LOAD_FILE_EXTENTIONS = ['npy']
+    LOAD_FILE_EXTENTIONS = ['npz', 'npy']
     LOAD_PATH_TYPE = PathType.FILE
-    SAVE_FILE_EXTENTIONS = ['npy']
+    SAVE_FILE_EXTENTIONS = ['npz', 'npy']
     SAVE_PATH_TYPE = PathType.FILE
 
     def __init__(self, values, name=None, eres=None):
@@ -64,9 +64,9 @@ class EnergyMap(DataItem, Saveable, Loadable):
         -------
         float
             Stored value if set in constructor, else estimates resolution from
-            map values.
+            map values. The estimate is only computed once and then stored.
         """
-        if not self._eres:
+        if self._eres is None:
             self._eres = self._inferRes()*1.1
         return self._eres
 
@@ -83,25 +83,20 @@ class EnergyMap(DataItem, Saveable, Loadable):
         float
             Calculated estimate of resolution of energy map.
         """
-        testedsegments = 0
         numtestsegments = 5
-        eres = 0.0
-        while testedsegments < numtestsegments:
-            col = self.values[random.randint(0, self.values.shape[X]-1)]
-            validyvals = np.where(col>0)[0] # np.where returns list in tuple
-            if len(validyvals) == 0:
-                continue
-            else:
-                segmentstart = validyvals[0]
-                i = segmentstart+1
-                while i!=self.dims[Y] and col[i]>0:
-                    i+=1
-                segmentend = i-1
-                segmentlen = segmentend-segmentstart
-                energychange = col[segmentend]-col[segmentstart]
-                eres += (energychange/segmentlen)
-                testedsegments+=1
-        eres /= numtestsegments
+        validcols = np.nonzero((self.values > 0).any(axis=Y))[0]
+        if len(validcols) == 0:
+            raise ValueError("Energy map has no valid regions.")
+        rng = np.random.default_rng()
+        cols = rng.choice(validcols, size=min(numtestsegments, len(validcols)),
+            replace=False)
+        if HAVE_NUMBA:
+            colres = _getColEres()(self.values[cols])
+        else:
+            colres = np.empty(len(cols))
+            for i, col in enumerate(self.values[cols]):
+                _colEres(col, colres[i:i+1])
+        eres = float(np.nanmean(colres))
         return eres
 
     def calcSpectra(self, scan):
@@ -125,19 +120,33 @@ class EnergyMap(DataItem, Saveable, Loadable):
         """
         Save energy map to file.
 
-        Energy resolution is not saved. This will be added in the future.
+        Maps saved to NPZ files are compressed, and the energy resolution is
+        saved alongside the map values if it has been set or calculated. NPY
+        files hold only the map values.
 
         Parameters
         ----------
         fpath : Path
             Path of file to which to save energy map
         """
-        np.save(fpath, self.values)
+        fpath = Path(fpath)
+        if fpath.suffix.lower() == '.npy':
+            np.save(fpath, self.values)
+        elif fpath.suffix.lower() == '.npz':
+            eres = self._eres if self._eres is not None else np.nan
+            np.savez_compressed(fpath, values=self.values,
+                eres=np.float64(eres))
+        else:
+            raise ValueError(f'Cannot save EnergyMap to "{fpath.suffix.upper()}" file. Only NPZ and NPY supported.')
 
     def loadFromPath(fpath):
         """
         Load energy map from file.
 
+        Both NPZ files written by :obj:`EnergyMap.saveToPath` and plain NPY
+        files of map values are supported. NPY files are memory-mapped rather
+        than read into memory.
+
         Parameters
         ----------
         fpath : Path
@@ -149,57 +158,280 @@ class EnergyMap(DataItem, Saveable, Loadable):
             Energy map loaded from file.
         """
         fpath = Path(fpath)
-        emapvals = np.load(fpath)
-        return EnergyMap(emapvals, fpath.stem)
+        if fpath.suffix.lower() == '.npy':
+            return EnergyMap(np.load(fpath, mmap_mode='r'), fpath.stem)
+        with np.load(fpath) as z:
+            emapvals = z['values']
+            eres = float(z['eres']) if 'eres' in z else np.nan
+        return EnergyMap(emapvals, fpath.stem,
+            eres=None if np.isnan(eres) else eres)
 
     # def __add__(self, other:EnergyMap) -> EnergyMap:
     #     return EnergyMap(self.values+other.values)
 
 
-def calcEMap(scanset, hrois):
+_TILE_WIDTH = 64   # Number of columns of energy map calculated at a time
+
+
+def _colEres(col, out):
+    """Measure energy resolution along a column of an energy map.
+
+    Uses the first segment of valid (positive) energies in the column. See
+    :obj:`_getColEres` for a version that applies to many columns at once.
+
+    Parameters
+    ----------
+    col : :obj:`numpy.ndarray`
+        1D array of energies along a column of an energy map.
+    out : :obj:`numpy.ndarray`
+        Output set to change in energy per pixel along the segment, or NaN if
+        the column has no valid segment at least 2 pixels long.
+    """
+    n = col.shape[0]
+    segmentstart = 0
+    while segmentstart < n and col[segmentstart] <= 0:
+        segmentstart += 1
+    segmentend = segmentstart
+    while segmentend+1 < n and col[segmentend+1] > 0:
+        segmentend += 1
+    if segmentend >= n or segmentend == segmentstart:
+        out[0] = np.nan
+    else:
+        out[0] = (col[segmentend]-col[segmentstart])/(segmentend-segmentstart)
+
+
+@functools.lru_cache(maxsize=None)
+def _getColEres():
+    """Get :obj:`_colEres` compiled as a generalized ufunc, so it can be applied
+    to a 2D array of columns at once. Requires Numba.
+
+    Created on first use rather than on import, since creating it imports
+    Numba and compiles or loads the ufunc.
+    """
+    return guvectorize(
+        ['void(float32[:], float64[:])', 'void(float64[:], float64[:])'],
+        '(n)->()', nopython=True, cache=True)(_colEres)
+
+
+def _fitLineModel(points, deg):
+    """Fit a polynomial to the weighted points of a line in an image.
+
+    Equivalent to ``np.polyfit(x, y, deg, w=z)`` but solves the least squares
+    problem directly with LAPACK's ``gelsy`` driver, which is cheaper than the
+    SVD-based solve used by :obj:`numpy.polyfit`.
+
+    Parameters
+    ----------
+    points : :obj:`numpy.ndarray`
+        Array of points in the form (x,y,z), where z is used as the weight.
+    deg : :obj:`int`
+        Degree of polynomial.
+
+    Returns
+    -------
+    :obj:`numpy.ndarray`
+        Polynomial coefficients, highest power first.
+    """
+    from scipy import linalg  # Imported here so loading emap doesn't need scipy
+    x, y, w = points[:,0], points[:,1], points[:,2]
+    lhs = np.vander(x, deg+1) * w[:,None]
+    rhs = y * w
+    # Scale columns to improve conditioning, as numpy.polyfit does
+    scale = np.sqrt((lhs*lhs).sum(axis=0))
+    scale[scale == 0] = 1
+    c = linalg.lstsq(lhs/scale, rhs, check_finite=False, lapack_driver='gelsy')[0]
+    return c/scale
+
+
+def _cubicSplineCoeffs(knots, values):
+    """Calculate coefficients of many cubic splines at once.
+
+    Gives the same splines as :obj:`scipy.interpolate.CubicSpline` with
+    not-a-knot end conditions, but solves for all of them with one batched
+    linear solve instead of constructing each separately.
+
+    Parameters
+    ----------
+    knots : :obj:`numpy.ndarray`
+        Array of shape (number of splines, n) of strictly increasing knot
+        positions for each spline. At least 4 knots are needed.
+    values : :obj:`numpy.ndarray`
+        Array of same shape as ``knots`` of values at each knot.
+
+    Returns
+    -------
+    :obj:`numpy.ndarray`
+        Array of shape (number of splines, 4, n-1) of polynomial coefficients,
+        highest power first, for each segment of each spline. Each segment's
+        polynomial is in terms of distance from the segment's first knot.
+    """
+    n = knots.shape[1]
+    if n < 4:
+        raise ValueError(f"At least 4 points are needed to fit cubic spline, got {n}.")
+    dx = np.diff(knots, axis=1)
+    if not (dx > 0).all():
+        raise ValueError("Knots of cubic spline must be strictly increasing.")
+    slope = np.diff(values, axis=1)/dx
+    # Solve for derivative at each knot
+    A = np.zeros(knots.shape + (n,))
+    b = np.empty(knots.shape)
+    i = np.arange(1, n-1)
+    A[:,i,i-1] = dx[:,1:]
+    A[:,i,i] = 2*(dx[:,:-1] + dx[:,1:])
+    A[:,i,i+1] = dx[:,:-1]
+    b[:,1:-1] = 3*(dx[:,1:]*slope[:,:-1] + dx[:,:-1]*slope[:,1:])
+    # Not-a-knot end conditions
+    d = knots[:,2] - knots[:,0]
+    A[:,0,0] = dx[:,1]
+    A[:,0,1] = d
+    b[:,0] = ((dx[:,0] + 2*d)*dx[:,1]*slope[:,0] + dx[:,0]**2*slope[:,1])/d
+    d = knots[:,-1] - knots[:,-3]
+    A[:,-1,-1] = dx[:,-2]
+    A[:,-1,-2] = d
+    b[:,-1] = (dx[:,-1]**2*slope[:,-2] + (2*d + dx[:,-1])*dx[:,-2]*slope[:,-1])/d
+    s = np.linalg.solve(A, b[...,None])[...,0]
+    t = (s[:,:-1] + s[:,1:] - 2*slope)/dx
+    return np.stack((t/dx, (slope - s[:,:-1])/dx - t, s[:,:-1], values[:,:-1]),
+        axis=1)
+
+
+def _calcEMapBlock(hroi, images, energies, imgdims, model='spline'):
+    """Calculate the energy map values for the columns covered by one HROI.
+
+    Parameters
+    ----------
+    hroi : :obj:`.core.roi.HROI`
+        Horizontal region corresponding to a crystal.
+    images : :obj:`list`
+        Columns of calibration images covered by the HROI, one for each
+        energy, starting from the first whole column of the HROI.
+    energies : :obj:`list`
+        Incident energy of each calibration image.
+    imgdims : :obj:`tuple`
+        Dimensions of calibration images.
+    model : :obj:`str`
+        Model of energy along each column, see :obj:`calcEMap`.
+
+    Returns
+    -------
+    :obj:`tuple`
+        Range of columns covered and energy map values for those columns, in
+        form (lox, hix, block).
+    """
+    # Generate models for the line in the group in each image
+    # The line corresponds to a single energy
+    lox, hix = hroi
+    x0 = int(np.ceil(lox))  # Column of image where the images given start
+    linemodels = {}
+    imgheight = imgdims[Y]
+    grouparea = [[0,round(imgheight/10)],[hix-x0,round(imgheight*9/10)]]
+    for energy, image in zip(energies, images):
+        points = getCoordsFromImage(image, area=grouparea, subsample=None)
+        points[:,X] += x0
+        linemodels[energy] = _fitLineModel(points, 4)
+    # Evaluate every line model over the whole column range at once as a
+    # single matrix product of the Vandermonde matrix of the columns with the
+    # model coefficients, giving an array of shape
+    # (number of columns, number of energies)
+    xvals = np.arange(int(np.ceil(lox)), int(np.ceil(hix)))
+    coeffs = np.stack([linemodels[energy] for energy in linemodels])
+    all_known_yvals = np.vander(xvals.astype(float), coeffs.shape[1]) @ coeffs.T
+    known_evals = np.asarray(energies)
+    block = np.full((len(xvals), imgheight), -1, dtype=np.float32)
+    # Fit function to each column with energy as a function of pixel height y
+    if model == 'spline':
+        # Cubic spline through known points, fit for all columns at once
+        order = np.argsort(all_known_yvals, axis=1)  # Spline needs increasing y
+        knots = np.take_along_axis(all_known_yvals, order, axis=1)
+        # There is no spline through a column where the lines of two energies
+        # meet, so such columns are left invalid
+        fitted = (np.diff(knots, axis=1) > 0).all(axis=1)
+        splinecoeffs = np.full((len(xvals), 4, knots.shape[1]-1), np.nan)
+        splinecoeffs[fitted] = _cubicSplineCoeffs(knots[fitted],
+            known_evals[order][fitted])
+    elif model == 'bragg':
+        # Based on Bragg's Angle formula, E=a/y for some a value. The model is
+        # linear in a, so the least squares fit has a closed form.
+        a = (known_evals/all_known_yvals).sum(axis=1) / \
+            (1/all_known_yvals**2).sum(axis=1)
+        fitted = np.ones(len(xvals), dtype=bool)
+    else:
+        raise ValueError(f'Unknown energy map model "{model}".')
+    ylo = np.ceil(all_known_yvals.min(axis=1)).astype(int)
+    yhi = np.trunc(all_known_yvals.max(axis=1)).astype(int)
+    # Generate the energymap values for the pixels within the group, a tile of
+    # columns at a time so that intermediate arrays stay small
+    for start in range(0, len(xvals), _TILE_WIDTH):
+        tile = slice(start, start+_TILE_WIDTH)
+        ystart = max(ylo[tile].min(), 0)
+        yvals = np.arange(ystart, min(yhi[tile].max(), imgheight))
+        if len(yvals) == 0:
+            continue
+        if model == 'spline':
+            # Spline segment containing each y value in each column
+            seg = (knots[tile,None,1:-1] <= yvals[None,:,None]).sum(axis=2)
+            t = yvals[None,:] - np.take_along_axis(knots[tile], seg, axis=1)
+            c = np.take_along_axis(splinecoeffs[tile], seg[:,None,:], axis=2)
+            evals = ((c[:,0]*t + c[:,1])*t + c[:,2])*t + c[:,3]
+        else:
+            evals = a[tile,None]/yvals[None,:]
+        inrange = (yvals[None,:] >= ylo[tile,None]) & \
+            (yvals[None,:] < yhi[tile,None]) & fitted[tile,None]
+        block[tile, ystart:ystart+len(yvals)] = np.where(inrange, evals, -1)
+    return int(np.ceil(lox)), int(np.ceil(hix)), block
+
+
+def calcEMap(scanset, hrois, processes=None, model='spline'):
     """Function that calculates an pixel-to-energy mapping (an energy map) from a
     set of scans and the horizontal pixel ranges (the groups) that have been
     determined to correspond to different crystals in the scans.
 
+    Each HROI is processed independently, so they can optionally be
+    distributed over a pool of worker processes. The workers are started with
+    the ``'spawn'`` method, so scripts using them must guard their main code
+    with ``if __name__ == '__main__':``.
+
     Parameters
     ----------
     scanset : ScanSet
         Set of calibration scans.
     hrois : list
         List of :obj:`.core.roi.HROI` corresponding to each crystal.
+    processes : :obj:`int`, optional
+        Number of worker processes to use. By default HROIs are processed
+        serially in the calling process.
+    model : :obj:`str`, optional
+        Model of energy as a function of pixel height within each column.
+        ``'spline'`` (default) interpolates the calibration energies with a
+        cubic spline. ``'bragg'`` fits E=a/y, following Bragg's law.
 
     Returns
     -------
-    np.ndarray
-        2D array same size as scans of energy values
+    EnergyMap
+        Energy map with float32 array same size as scans of energy values
         corresponding to each pixel.
     """
-    emap = np.full(scanset.dims, float(-1)) #Energy map same size as image, default -1 (invalid)
+    # Energy map same size as image, default -1 (invalid). Single precision is
+    # ample for energies of a few keV at sub-eV resolution.
+    emap = np.full(scanset.dims, -1, dtype=np.float32)
+    energies = [s.meta['IncidentEnergy'] for s in scanset]
+    # Load images once here so they are sent to workers as plain arrays
+    images = [s.getImg(cuts=(6,10)) for s in scanset]
     # Find regression for each set of image points within each region
     # Each region should correspond to one crystal, or perhaps a pair of crystals
-    for hroi in hrois:
-        # Generate models for the line in the group in each image
-        # The line corresponds to a single energy
-        lox, hix = hroi
-        linemodels = {}
-        energies = [s.meta['IncidentEnergy'] for s in scanset]
-        for scan in scanset:
-            energy = scan.meta['IncidentEnergy']
-            image = scan.getImg(cuts=(6,10))
-            imgheight = scanset.dims[Y]
-            grouparea = [[lox,round(imgheight/10)],[hix,round(imgheight*9/10)]]
-            points = np.array(getCoordsFromImage(image, area=grouparea, subsample=None))
-            linemodels[energy]=np.poly1d(np.polyfit(points[:,0], points[:,1], 4, w=points[:,2]))
-        # Generate the energymap values for the pixels within the group
-        for xval in range(int(np.ceil(lox)), int(np.ceil(hix))):
-            # Fit function to column with energy as a function of pixel height y
-            # Based on Bragg's Angle formula, E=a/y for some a value
-            known_yvals = [linemodels[energy](xval) for energy in linemodels]
-            known_evals = energies
-            #def efunc(y, a): return a/y
-            #fitparams, cov = curve_fit(efunc, known_yvals, known_evals)[0]
-            efunc = interpolate.interp1d(known_yvals, known_evals, kind='cubic')
-            for yval in range(int(np.ceil(min(known_yvals))), int(max(known_yvals))):
-                #emap[xval][yval] = efunc(yval, a)
-                emap[xval][yval] = efunc(yval)
+    if model not in ('spline', 'bragg'):
+        raise ValueError(f'Unknown energy map model "{model}".')
+    # Each HROI only needs its own columns of the images, so only those are
+    # sent to workers
+    args = [(hroi, [img[int(np.ceil(hroi.lo)):int(np.ceil(hroi.hi))]
+        for img in images], energies, scanset.dims, model) for hroi in hrois]
+    if processes is not None and processes > 1 and len(hrois) > 1:
+        # Forking is unsafe once Numba's parallel kernels have started threads
+        ctx = multiprocessing.get_context('spawn')
+        with ctx.Pool(processes=processes) as pool:
+            blocks = pool.starmap(_calcEMapBlock, args)
+    else:
+        blocks = [_calcEMapBlock(*a) for a in args]
+    for lox, hix, block in blocks:
+        emap[lox:hix] = block
     return EnergyMap(emap)
@@ -2,6 +2,7 @@ from .conventions import PathType
 from .signal import Signal
 
 import uuid
+import numpy as np
 
 # Dev Note: I could try metaclasses but that seems like a rabbit hole of
 # abstract typing.
@@ -146,7 +147,10 @@ class DataItemSet:
         self.selectionchanged = Signal()
 
         self.items = []
-        self.selections = {}
+        # Selection status of each item, in same order as items. Allocated with
+        # spare capacity so adding items doesn't reallocate every time.
+        self._sel = np.zeros(0, dtype=bool)
+        self._selmap = {}   # Maps uuid of item to its index in items
         self.selection_default = selection_default
 
         if items is not None:
@@ -154,15 +158,26 @@ class DataItemSet:
                 self.add(item)
 
     def add(self, item):
-        """Add :obj:`DataItem` to set."""
+        """Add :obj:`DataItem` to set. Adding an item already in set does
+        nothing."""
+        if item.uuid in self._selmap:
+            return
+        n = len(self.items)
+        if n == len(self._sel):
+            self._sel = np.concatenate((self._sel, np.zeros(max(n, 8), dtype=bool)))
+        self._sel[n] = self.selection_default
+        self._selmap[item.uuid] = n
         self.items.append(item)
-        self.selections[item] = self.selection_default
         self.itemadded.emit(item)
 
     def remove(self, item):
         """Remove :obj:`DataItem` from set."""
-        self.items.remove(item)
-        self.selections.pop(item)
+        i = self._selmap.pop(item.uuid)
+        n = len(self.items)
+        del self.items[i]
+        self._sel[i:n-1] = self._sel[i+1:n]
+        for j in range(i, n-1):
+            self._selmap[self.items[j].uuid] = j
         self.itemremoved.emit(item)
 
     def setSelection(self, item, sel):
@@ -175,17 +190,18 @@ class DataItemSet:
         sel : :obj:`bool`
             New selection status.
         """
-        if self.selections[item] != sel:
-            self.selections[item] = sel
+        i = self._selmap[item.uuid]
+        if self._sel[i] != sel:
+            self._sel[i] = sel
             self.selectionchanged.emit(item, sel)
 
     def getSelection(self, item):
         """Get selection status of item."""
-        return self.selections[item]
+        return bool(self._sel[self._selmap[item.uuid]])
 
     def getSelected(self):
         """Get list of selected items."""
-        return [i for i in self if self.getSelection(i)]
+        return [self.items[i] for i in np.nonzero(self._sel[:len(self.items)])[0]]
 
     def __len__(self):
         return len(self.items)
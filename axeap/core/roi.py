@@ -24,17 +24,32 @@ class ROI(DataItem):
         """
         raise NotImplementedError("ROI is an abstract class and should not be instantiated")
 
+    def _applyZero(self, img):
+        """
+        Get copy of image with all areas not in ROI set to 0.
+
+        Unlike :obj:`ROI._selectArea` this returns a plain array rather than a
+        masked array.
+
+        Parameters
+        ----------
+        img : :obj:`numpy.ndarray`
+            The image to process.
+        """
+        return np.where(np.ma.getmaskarray(self._selectArea(img)), 0, img)
+
     # def apply(self, scan:Scan) -> Scan:
-    #     return Scan(self._selectArea(scan.getImg()).filled(0))
+    #     return Scan(self._applyZero(scan.getImg()))
 
     def __repr__(self):
         return "ROI()"
 
     def __hash__(self):
-        """Hash is computed as hash of string representation of ROI. String
+        """Fallback hash computed from string representation of ROI. String
         representation must therefore be comprehensive of data encoded by ROI.
+        Subclasses should override this with a hash of their fields.
         """
-        return hash(tuple(bytes(repr(self),'ascii')))   # Hack much?
+        return hash(repr(self))
 
 
 class ComboROI(ROI):
@@ -51,15 +66,18 @@ class ComboROI(ROI):
         self.comps = rois   # Component ROIs
 
     def _selectArea(self, img):
-        invmask = None
+        inside = np.zeros(img.shape, dtype=bool)
         for roi in self.comps:
-            if invmask is None: invmask = ~roi._selectArea(img).mask
-            else: invmask = invmask + ~roi._selectArea(img).mask
-        return np.ma.array(img, mask= ~invmask)
+            np.logical_or(inside, ~np.ma.getmaskarray(roi._selectArea(img)),
+                out=inside)
+        return np.ma.array(img, mask=~inside)
 
     def __repr__(self):
         return "ComboROI("+"".join([str(c)+',' for c in self.comps])+")"
 
+    def __hash__(self):
+        return hash((type(self).__name__, self.comps))
+
 
 class RectangleROI(ROI):
     '''Rectangular ROI
@@ -98,15 +116,54 @@ class RectangleROI(ROI):
         '''
         return RectangleROI((hroi.lo, vroi.lo), (hroi.hi, vroi.hi))
 
+    def toArrays(rois):
+        '''Get bounds of several rectangular ROIs as arrays.
+
+        Parameters
+        ----------
+        rois : iterable of :obj:`RectangleROI`
+            ROIs to get bounds of.
+
+        Returns
+        -------
+        :obj:`dict`
+            Arrays of ``lox``, ``loy``, ``hix`` and ``hiy`` values, in the same
+            order as ``rois``.
+        '''
+        bounds = np.array([(r.lox, r.loy, r.hix, r.hiy) for r in rois],
+            dtype=int).reshape(-1, 4)
+        return dict(zip(('lox', 'loy', 'hix', 'hiy'), bounds.T))
+
     def _selectArea(self, img):
         # Use slices to create no-copy view
         # return np.ma.array(img[self.lox:self.hix+1,
         #                     self.loy:self.hiy+1], copy=False)
         # Let's try masks instead
-        mask = np.ones(img.shape)
-        mask[self.lox:self.hix+1,self.loy:self.hiy+1] = 0
+        mask = np.ones(img.shape, dtype=bool)
+        mask[self.lox:self.hix+1,self.loy:self.hiy+1] = False
         return np.ma.array(img, mask=mask)
 
+    def view(self, img):
+        """
+        Get the part of an image inside the ROI as a no-copy view.
+
+        Parameters
+        ----------
+        img : :obj:`numpy.ndarray`
+            The image to take view of.
+
+        Returns
+        -------
+        :obj:`numpy.ndarray`
+            Slice of image covered by ROI.
+        """
+        return img[self.lox:self.hix+1,self.loy:self.hiy+1]
+
+    def _applyZero(self, img):
+        out = np.zeros_like(img)
+        self.view(out)[...] = self.view(img)
+        return out
+
     def __repr__(self):
         return f"RectangleROI(({self.lox},{self.loy}), ({self.hix},{self.hiy}))"
 
@@ -118,7 +175,7 @@ class RectangleROI(ROI):
             return False
 
     def __hash__(self):
-        return ROI.__hash__(self)
+        return hash((type(self).__name__, self.lox, self.loy, self.hix, self.hiy))
 
 
 class EllipseROI(ROI):
@@ -139,14 +196,16 @@ class EllipseROI(ROI):
         self.x, self.y, self.rx, self.ry = *p, rx, ry
 
     def _selectArea(self, img):
-        mask = np.ones(img.shape)
-        for y in np.arange(np.ceil(self.y-self.ry), np.ceil(self.y+self.ry), 1):
-            #print('y', y)
-            halfwidth = self.rx*(1-((self.y-y)/self.ry)**2)**(1/2)
-            lox, hix = self.x-halfwidth, self.x+halfwidth
-            for x in np.arange(np.ceil(lox), np.ceil(hix), 1):
-                #print('x', x)
-                mask[int(x),int(y)] = 0
+        mask = np.ones(img.shape, dtype=bool)
+        # Only test pixels within bounding box of ellipse
+        lox = max(int(np.floor(self.x-self.rx)), 0)
+        hix = min(int(np.ceil(self.x+self.rx))+1, img.shape[X])
+        loy = max(int(np.floor(self.y-self.ry)), 0)
+        hiy = min(int(np.ceil(self.y+self.ry))+1, img.shape[Y])
+        xs = np.arange(lox, hix)[:,None]
+        ys = np.arange(loy, hiy)[None,:]
+        inside = ((xs-self.x)/self.rx)**2 + ((ys-self.y)/self.ry)**2 <= 1
+        mask[lox:hix,loy:hiy] = ~inside
         return np.ma.array(img, mask=mask)
         # Could use cv2.ellipse instead
 
@@ -154,6 +213,9 @@ class EllipseROI(ROI):
         return f"EllipseROI(({self.x},{self.y})," \
             f"{self.rx},{self.ry})"
 
+    def __hash__(self):
+        return hash((type(self).__name__, self.x, self.y, self.rx, self.ry))
+
 class SpanROI(ROI):
     """
     Abstract superclass to :obj:`HROI` and :obj:`VROI`. Do not instantiate.
@@ -170,18 +232,52 @@ class SpanROI(ROI):
         ROI.__init__(self, **kwargs)
         self.lo, self.hi = sorted((int(np.ceil(p1)), int(np.ceil(p2))))
 
+    def toArrays(rois):
+        '''Get ends of several span ROIs as arrays.
+
+        Parameters
+        ----------
+        rois : iterable of :obj:`SpanROI`
+            ROIs to get ends of.
+
+        Returns
+        -------
+        :obj:`dict`
+            Arrays of ``lo`` and ``hi`` values, in the same order as ``rois``.
+        '''
+        ends = np.array([(r.lo, r.hi) for r in rois], dtype=int).reshape(-1, 2)
+        return dict(lo=ends[:,0], hi=ends[:,1])
+
     def __iter__(self):
         return iter((self.lo, self.hi))
 
+    def _applyZero(self, img):
+        out = np.zeros_like(img)
+        self.view(out)[...] = self.view(img)
+        return out
+
+    def __eq__(self, other):
+        if type(other) is type(self):
+            return self.lo==other.lo and self.hi==other.hi
+        else:
+            return False
+
+    def __hash__(self):
+        return hash((type(self).__name__, self.lo, self.hi))
+
 
 class HROI(SpanROI):
     """ROI spanning range along x-axis."""
 
     def _selectArea(self, img):
-        mask = np.ones(img.shape)
-        mask[self.lo:self.hi+1,:] = 0
+        mask = np.ones(img.shape, dtype=bool)
+        mask[self.lo:self.hi+1,:] = False
         return np.ma.array(img, mask=mask)
 
+    def view(self, img):
+        """Get the columns of an image inside the ROI as a no-copy view."""
+        return img[self.lo:self.hi+1,:]
+
     def __repr__(self):
         return f"HROI(x={self.lo}:{self.hi})"
 
@@ -193,10 +289,14 @@ class VROI(SpanROI):
     """ROI spanning range along y-axis."""
 
     def _selectArea(self, img):
-        mask = np.ones(img.shape)
-        mask[:, self.lo:self.hi+1] = 0
+        mask = np.ones(img.shape, dtype=bool)
+        mask[:, self.lo:self.hi+1] = False
         return np.ma.array(img, mask=mask)
 
+    def view(self, img):
+        """Get the rows of an image inside the ROI as a no-copy view."""
+        return img[:, self.lo:self.hi+1]
+
     def __repr__(self):
         return f"VROI(y={self.lo}:{self.hi})"
 
@@ -208,6 +308,44 @@ class ROISet(DataItemSet):
     """:obj:`.core.item.DataItemSet` for :obj:`ROI`'s
     """
 
+    SOA_MIN_SIZE = 16
+    """Minimum number of ROIs for which bounds are tested as arrays."""
+
+    _bounds = None  # Cached bounds of RectangleROIs in set, see _rectBounds
+
+    def add(self, roi):
+        """Add ROI to set.
+
+        See :obj:`.core.item.DataItemSet.add`.
+        """
+        self._bounds = None
+        DataItemSet.add(self, roi)
+
+    def remove(self, roi):
+        """Remove ROI from set.
+
+        See :obj:`.core.item.DataItemSet.remove`.
+        """
+        self._bounds = None
+        DataItemSet.remove(self, roi)
+
+    def _rectBounds(self):
+        """Get bounds of all :obj:`RectangleROI`'s in set as arrays.
+
+        Returns
+        -------
+        :obj:`tuple`
+            Arrays of indices into items, lox, loy, hix and hiy for each
+            rectangular ROI. Cached until membership of set changes.
+        """
+        if self._bounds is None:
+            indices = [i for i, roi in enumerate(self.items)
+                if isinstance(roi, RectangleROI)]
+            bounds = RectangleROI.toArrays(self.items[i] for i in indices)
+            self._bounds = (np.array(indices, dtype=int), bounds['lox'],
+                bounds['loy'], bounds['hix'], bounds['hiy'])
+        return self._bounds
+
     def getROIsInside(self, nroi):
         """Get ROIs in set contained by given ROI
 
@@ -223,7 +361,11 @@ class ROISet(DataItemSet):
         """
         if not isinstance(nroi, RectangleROI):
             return []   # TODO: Add functionality for non-rectangular ROIs
-        inside = [roi for roi in self if \
-            roi.lox >= nroi.lox and roi.loy >= nroi.loy and \
-            roi.hix <= nroi.hix and roi.hiy <= nroi.hiy]
-        return inside
+        if len(self) < self.SOA_MIN_SIZE:
+            return [roi for roi in self if isinstance(roi, RectangleROI) and \
+                roi.lox >= nroi.lox and roi.loy >= nroi.loy and \
+                roi.hix <= nroi.hix and roi.hiy <= nroi.hiy]
+        indices, lox, loy, hix, hiy = self._rectBounds()
+        inside = (lox >= nroi.lox) & (loy >= nroi.loy) & \
+            (hix <= nroi.hix) & (hiy <= nroi.hiy)
+        return [self.items[i] for i in indices[inside]]
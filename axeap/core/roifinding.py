@@ -3,11 +3,15 @@
 
 import numpy as np
 import cv2
+from concurrent.futures import ThreadPoolExecutor
 
 from .conventions import X, Y
 from .scan import Scan, ScanSet
 from .roi import HROI, VROI
-from ..utils import linearoverlap, separateSpans
+from ..utils import separateSpans
+
+DEFAULT_ANGLERANGE = (0, np.pi/6)
+"""Default range of line segment angles used to find HROIs."""
 
 # # Return ComboROI with background guesses
 # def findBackground(ss, tile_dims=None, mindivisions=10):
@@ -71,34 +75,17 @@ def calcHROIs(
     """
     s = scan.mod(blur=3)
     lines2d = calcHorizontalLineSegments(s, round(min_width))
-    flattened = [[l[0][X], l[1][X]] for l in lines2d] # Flatten to just x coords
-    midyvals = [(l[0][Y]+l[1][Y])/2 for l in lines2d] # Midpoint y values
-    lines = [{'flat':flattened[i], 'midy': midyvals[i]} \
-        for i in range(len(flattened))]
-    # Combine overlapping lines
-    checkcomplete = False
-    while not checkcomplete:
-        matchfound = False
-        for l1 in range(len(lines)):
-            for l2 in range(len(lines)):
-                if l1==l2: continue
-                flat1 = lines[l1]['flat']
-                flat2 = lines[l2]['flat']
-                overlap = linearoverlap(flat1, flat2)
-                if overlap[0]>0.5 or overlap[1]>0.5:
-                    newflat = [min(flat1[0], flat2[0]), max(flat1[1],flat2[1])]
-                    newmidy = (lines[l1]['midy']+lines[l2]['midy'])/2
-                    newline = {'flat':newflat, 'midy':newmidy}
-                    lines.pop(max(l1,l2))
-                    lines.pop(min(l1,l2))
-                    lines.append(newline)
-                    matchfound = True
-                    break
-            if matchfound:
-                break
-        if not matchfound:
-            checkcomplete = True
-    groups = [l['flat'] for l in lines]
+    if len(lines2d) == 0:
+        return ([], lines2d) if return_lines else []
+    # Flatten to just x coords, points of each line are already sorted by x
+    flats = lines2d[:,:,X].astype(float)
+    # Combine overlapping lines in a single sweep over the lines sorted by
+    # their left ends. A line is merged into the current group if they overlap
+    # by more than 50% of the length of the shorter of the two.
+    flats = flats[np.argsort(flats[:,0], kind='stable')]
+    from ._roi_kernels import _merge_lines  # Loads Numba, so only when needed
+    los, his = _merge_lines(flats, 0.5)
+    groups = np.stack([los, his], axis=1).tolist()
     # Eliminate overlap between groups
     groups = separateSpans(groups, group_buffer)
     groups = np.array(groups)
@@ -122,33 +109,36 @@ def calcHorizontalLineSegments(scan, min_line_length, anglerange=None):
         Minimum length line segments must be.
     anglerange : :obj:`tuple`
         Range of angles that line segments must be within. Horizontal is 0,
-        vertical is pi/2. Range encoded as (t1,t2).
+        vertical is pi/2. Range encoded as (t1,t2). Defaults to
+        :obj:`DEFAULT_ANGLERANGE`.
 
     Returns
     -------
     :obj:`numpy.ndarray`
         Array of line segments encoded as [[x1,y1],[x2,y2]]
     """
-    anglerange = anglerange or (0, np.pi/6)
-    fld = cv2.ximgproc.createFastLineDetector(length_threshold=min_line_length,\
-                                                do_merge=True)
-    img = scan.getImg().astype(int)
-    img[np.where(img>0)] = 255
-    rawlines = fld.detect(img.astype(np.uint8))
+    anglerange = anglerange or DEFAULT_ANGLERANGE
+    # Pixels with intensity of at least 1 make up the lines. HoughLinesP only
+    # needs non-zero pixels, so the boolean mask is passed as 0/1 bytes.
+    img = (scan.getImg()>=1).view(np.uint8)
+    rawlines = cv2.HoughLinesP(img, rho=1, theta=np.pi/180,
+        threshold=max(1, int(min_line_length*0.5)),
+        minLineLength=min_line_length, maxLineGap=5)
     if rawlines is None:
         return []
     else:
-        lines = np.array(rawlines)[:,0,:]
-    lines[:,[X,Y]] = lines[:,[Y,X]]     # Flip coords to x,y
-    lines[:,[X+2,Y+2]] = lines[:,[Y+2,X+2]]
-    tan_angles = np.abs((lines[:,Y]-lines[:,Y+2])/(lines[:,X]-lines[:,X+2]))
-    filteredlines = np.delete(lines, np.where(np.logical_and(
-        tan_angles<np.tan(anglerange[0]), tan_angles>np.tan(anglerange[1]))),
-        axis=0) # Only take lines inside angle range
-    # Split into pairs of points
-    lines2d = np.array([[[l[X],l[Y]],[l[X+2],l[Y+2]]] for l in filteredlines])
-    # Sort each line by x values of points
-    lines2d = np.array([l[np.argsort(l[:,0])] for l in lines2d])
+        lines = np.array(rawlines, dtype=np.float32)[:,0,:]
+    lines = lines[:,[1,0,3,2]]  # Flip coords to x,y
+    # Compare slopes against tangents of range instead of computing angles,
+    # using absolute differences so that segment direction does not matter
+    tanlo, tanhi = np.tan(anglerange)
+    dx = np.abs(lines[:,X+2]-lines[:,X])
+    dy = np.abs(lines[:,Y+2]-lines[:,Y])
+    lines = lines[(dy>=tanlo*dx) & (dy<=tanhi*dx)]
+    # Split into pairs of points and sort each line by x values of points
+    pts = lines.reshape(-1,2,2)
+    order = np.argsort(pts[:,:,X], axis=1)
+    lines2d = np.take_along_axis(pts, order[:,:,None], axis=1)
     return lines2d
 
 
@@ -174,30 +164,80 @@ def calcVROIs(
     buffer : :obj:`int`
         Extra space to add around VROI.
     """
-    img = scan.getImg().copy()
-    img[img>0]=1
-    vd = img.sum(0)
-    cvd = vd.copy()
-    cvd[cvd<(np.max(vd)*cutoff_frac)] = 0
-    vroistart = -1
-    lastsaw = None
-    vrois = []
-    for x in range(scan.dims[Y]):
-        if cvd[x]>0: # If in a stretch
-            lastsaw = x
-            if vroistart == -1: vroistart = x
-        elif vroistart != -1 and x-lastsaw > maxgap: # If at a zero and empty stretch is fraction of roi so far
-            if lastsaw-vroistart > minheight: # If the length of thr roi is more than the minimum, complete it
-                lo = vroistart-buffer if vroistart>buffer else 0
-                hi = lastsaw+buffer if (lastsaw+buffer)<scan.dims[Y] else scan.dims[Y]
-                vrois.append(VROI(lo, hi))
-                vroistart = -1
-            else: vroistart = -1
-    if vroistart!=-1 and lastsaw-vroistart > minheight:
-        vrois.append(vrois.append(VROI(vroistart, lastsaw)))
+    vd = scan.getImg(binary=True).sum(0, dtype=np.int32)
+    active = (vd>=vd.max()*cutoff_frac) & (vd>0)
+    # Find runs of non-zero density above cutoff, as [start, end) index pairs
+    edges = np.diff(active.astype(np.int8), prepend=0, append=0)
+    starts = np.nonzero(edges==1)[0]
+    ends = np.nonzero(edges==-1)[0]
+    if len(starts) == 0:
+        return []
+    # Merge runs separated by no more than maxgap pixels
+    split = starts[1:]-ends[:-1] > maxgap
+    starts = np.concatenate([starts[:1], starts[1:][split]])
+    lastsaw = np.concatenate([ends[:-1][split], ends[-1:]]) - 1
+    keep = lastsaw-starts > minheight
+    los = np.maximum(starts[keep]-buffer, 0)
+    his = np.minimum(lastsaw[keep]+buffer, scan.dims[Y])
+    vrois = [VROI(lo, hi) for lo, hi in zip(los.tolist(), his.tolist())]
     return vrois
 
 
+def calcHROIsBatch(scans, min_width, group_buffer=0, threads=None):
+    """Calculate HROIs for each of several scans in parallel.
+
+    Scans are processed in a pool of threads, since the image processing done
+    by :obj:`calcHROIs` releases the GIL.
+
+    Parameters
+    ----------
+    scans : iterable of :obj:`.core.scan.Scan`
+        Scans to calculate HROIs for, such as a :obj:`.core.scan.ScanSet`.
+    min_width : :obj:`float`
+        See :obj:`calcHROIs`.
+    group_buffer : :obj:`float`
+        See :obj:`calcHROIs`.
+    threads : :obj:`int`, optional
+        Number of worker threads to use. Defaults to the
+        :obj:`concurrent.futures.ThreadPoolExecutor` default.
+
+    Returns
+    -------
+    :obj:`list`
+        List of lists of :obj:`.core.roi.HROI`, one for each scan, in order.
+    """
+    with ThreadPoolExecutor(max_workers=threads) as ex:
+        return list(ex.map(lambda s: calcHROIs(s, min_width, group_buffer),
+            scans))
+
+
+def calcVROIsBatch(scans, minheight, maxgap, cutoff_frac=0.1, buffer=0,
+    threads=None):
+    """Calculate VROIs for each of several scans in parallel.
+
+    Scans are processed in a pool of threads, see :obj:`calcHROIsBatch`.
+
+    Parameters
+    ----------
+    scans : iterable of :obj:`.core.scan.Scan`
+        Scans to calculate VROIs for, such as a :obj:`.core.scan.ScanSet`.
+    minheight, maxgap, cutoff_frac, buffer
+        See :obj:`calcVROIs`.
+    threads : :obj:`int`, optional
+        Number of worker threads to use. Defaults to the
+        :obj:`concurrent.futures.ThreadPoolExecutor` default.
+
+    Returns
+    -------
+    :obj:`list`
+        List of lists of :obj:`.core.roi.VROI`, one for each scan, in order.
+    """
+    with ThreadPoolExecutor(max_workers=threads) as ex:
+        return list(ex.map(
+            lambda s: calcVROIs(s, minheight, maxgap, cutoff_frac, buffer),
+            scans))
+
+
 # def calcVROIs(
 #     scan:Scan,
 #     approx_height:Number,
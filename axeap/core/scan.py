@@ -8,9 +8,11 @@ import logging
 logger = logging.getLogger('axeap')
 
 from PIL import Image
-from scipy.ndimage.filters import gaussian_filter
+import tifffile
 import numpy as np
+import cv2
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 import re
 from watchdog.observers import Observer
@@ -33,6 +35,8 @@ class Scan(DataItem, Saveable, Loadable):
     SAVE_FILE_EXTENTIONS = ['tif', 'png', 'scan']
     SAVE_PATH_TYPE = PathType.FILE
     name = "Scan"
+    IMGCACHE_SIZE = 4
+    """Maximum number of processed images kept in a scan's image cache."""
 
     def __init__(self, img, imgspec=None, name=None, meta=None, cache=True):
         """
@@ -46,7 +50,8 @@ class Scan(DataItem, Saveable, Loadable):
             Pass :obj:`False` to turn off cacheing of images. An
             already-prepared cache of images in the form a dictionary of image
             specs to images can also be passed. Do not use unless you know what
-            you're doing.
+            you're doing. At most :obj:`IMGCACHE_SIZE` images are cached, the
+            least recently used are dropped first.
         """
         DataItem.__init__(self)
         self.img = img
@@ -96,26 +101,41 @@ class Scan(DataItem, Saveable, Loadable):
         :obj:`numpy.ndarray`
             2D array representing image.
         """
-        if self._imgcache is not None and imgspec in self._imgcache:
-            return self._imgcache[imgspec]
+        cache = self._imgcache
+        if cache is not None and imgspec in cache:
+            # Reinsert to mark as most recently used
+            img = cache[imgspec] = cache.pop(imgspec)
+            return img
         if imgspec == IS.NOCHANGE:
             return self.img
         cuts = imgspec['cuts']
         scale = imgspec['scale']
         blur = imgspec['blur']
         roi = imgspec['roi']
-        if cuts != -1 or blur != -1 or scale != -1:
+        binary = imgspec['binary']
+        if cuts != -1:
+            # Copy and zero out pixels outside the cuts in one pass
+            img = np.multiply(self.img, (self.img>=cuts[0])&(self.img<=cuts[1]))
+        elif blur != -1 or scale != -1:
             img = self.img.copy()
         else:
             img = self.img
-        if cuts != -1:
-            img[np.logical_or(img<cuts[0], img>cuts[1])] = 0
-        if blur!=-1: img = gaussian_filter(img, sigma=blur)
+        if blur!=-1:
+            # Same kernel radius and border handling as scipy's gaussian_filter
+            ksize = 2*int(4*blur+0.5)+1
+            src = np.ascontiguousarray(img, dtype=np.float32)
+            cv2.GaussianBlur(src, (ksize,ksize), blur, dst=src,
+                borderType=cv2.BORDER_REFLECT)
+            img = src.astype(img.dtype, copy=False)
         if scale != -1:
             img *= scale
-        if roi!=-1: img = roi._selectArea(img)
+        if roi!=-1: img = roi._applyZero(img)
+        if binary not in (-1, False): img = (img>0).astype(np.uint8)
         img.flags.writeable = False
-        if self._imgcache is not None: self._imgcache[imgspec] = img
+        if cache is not None:
+            cache[imgspec] = img
+            while len(cache) > self.IMGCACHE_SIZE:
+                del cache[next(iter(cache))]    # Evict least recently used
         return img
 
     def _getISFromArgs(self, *args, **kwargs):
@@ -154,7 +174,10 @@ class Scan(DataItem, Saveable, Loadable):
             Kernel size of gaussian blur to apply to image.
         roi : :obj:`.core.ROI`, optional
             Region of interest to which to restrict image. The rest of the image
-            will be masked off.
+            will be set to 0.
+        binary : :obj:`bool`, optional
+            If :obj:`True`, return a :obj:`numpy.uint8` image that is 1 where
+            the intensity is above 0 and 0 elsewhere.
 
         Returns
         -------
@@ -180,7 +203,10 @@ class Scan(DataItem, Saveable, Loadable):
             Kernel size of gaussian blur to apply to image.
         roi : :obj:`.core.ROI`, optional
             Region of interest to which to restrict image. The rest of the image
-            will be masked off.
+            will be set to 0.
+        binary : :obj:`bool`, optional
+            If :obj:`True`, return a :obj:`numpy.uint8` image that is 1 where
+            the intensity is above 0 and 0 elsewhere.
 
         Returns
         -------
@@ -206,11 +232,9 @@ class Scan(DataItem, Saveable, Loadable):
         fpath = Path(fpath) # Convert to Path in case passed as str
         img = None
         if fpath.suffix.lower() == '.tif' or fpath.suffix.lower() == '.tiff':
-            with open(fpath) as f:
-                img = np.array(Image.open(fpath), dtype=np.float32)
-                #img = np.array(Image.open(fpath))
-                img = np.swapaxes(img, 0, 1)
-                return img
+            # Transpose into a contiguous (x,y) array in the same pass as the
+            # conversion to float32
+            return np.ascontiguousarray(tifffile.imread(fpath).T, dtype=np.float32)
         elif fpath.suffix.lower() == '.npy':    # Only for loading .npy files exported by Scan
             return np.load(fpath)
         else:
@@ -281,13 +305,15 @@ class ImageSpec(dict):
     NOSCALE = -1
     NOBLUR = -1
     NOROI = -1
+    NOBINARY = -1
 
     def __init__(self,
         basespec=None,
         cuts=None,
         scale=None,
         blur=None,
-        roi=None):
+        roi=None,
+        binary=None):
         """
         Parameters
         ----------
@@ -302,28 +328,49 @@ class ImageSpec(dict):
             Kernel size of gaussian blur to apply to image.
         roi : :obj:`.core.ROI`, optional
             Region of interest to which to restrict image. The rest of the image
-            will be masked off.
+            will be set to 0.
+        binary : :obj:`bool`, optional
+            If :obj:`True`, return a :obj:`numpy.uint8` image that is 1 where
+            the intensity is above 0 and 0 elsewhere.
         """
         default = basespec if basespec is not None else ImageSpec.NOCHANGE
-        self['cuts'] = cuts if cuts is not None else default['cuts']
-        self['scale'] = scale if scale is not None else default['scale']
-        self['blur'] = blur if blur is not None else default['blur']
-        self['roi'] = roi if roi is not None else default['roi']
+        spec = dict(
+            cuts = cuts if cuts is not None else default['cuts'],
+            scale = scale if scale is not None else default['scale'],
+            blur = blur if blur is not None else default['blur'],
+            roi = roi if roi is not None else default['roi'],
+            binary = binary if binary is not None else default['binary'])
+        if isinstance(spec['cuts'], (list, np.ndarray)):
+            spec['cuts'] = tuple(spec['cuts'])
+        dict.__init__(self, spec)
+        # Specs are used as cache keys, so they are frozen and hashed once
+        self._values = tuple(spec.values())
+        self._hash = hash(self._values)
+
+    def _frozen(self, *args, **kwargs):
+        raise TypeError('ImageSpec objects cannot be modified.')
+
+    __setitem__ = __delitem__ = update = setdefault = pop = popitem = clear = _frozen
+
+    def __reduce__(self):
+        return (ImageSpec, (None, *self.values()))
 
     def __hash__(self):
-        return hash(tuple(sorted(self.items())))
+        return self._hash
 
     def __eq__(self, other):
-        if not isinstance(other, ImageSpec) and isinstance(other, dict):
+        if not isinstance(other, ImageSpec):
+            if not isinstance(other, dict):
+                return NotImplemented
             other = ImageSpec(**other)
-        return hash(self)==hash(other)
+        return self._values == other._values
 
-    @classmethod
-    @property
-    def NOCHANGE(cls):
-        """An ImageSpec that signifies no change to be made to an image."""
-        return ImageSpec({}, cuts=ImageSpec.NOCUTS, blur=ImageSpec.NOBLUR,
-                        scale=ImageSpec.NOSCALE, roi=ImageSpec.NOROI)
+
+ImageSpec.NOCHANGE = ImageSpec({}, cuts=ImageSpec.NOCUTS, blur=ImageSpec.NOBLUR,
+                            scale=ImageSpec.NOSCALE, roi=ImageSpec.NOROI,
+                            binary=ImageSpec.NOBINARY)
+"""An ImageSpec that signifies no change to be made to an image. Shared by all
+scans, specs are immutable."""
 
 IS = ImageSpec
 """Alias for ImageSpec."""
@@ -351,7 +398,9 @@ class ScanSet(DataItemSet, Loadable):
         fpaths = [fpath for fpath in dpath.glob('*')
             if fpath.suffix.lstrip('.').lower() in Scan.LOAD_FILE_EXTENTIONS]
         fpaths = sorted(fpaths, key=lambda x: int(get_trailing_number(x.stem,default=0)))
-        scans = [Scan.loadFromPath(fpath) for fpath in fpaths]
+        # Decoding releases the GIL, so files can be read in parallel threads
+        with ThreadPoolExecutor(max_workers=max(1, min(8, len(fpaths)))) as ex:
+            scans = list(ex.map(Scan.loadFromPath, fpaths))
         ss = ScanSet(scans, name=dpath.stem)
         if calibinfopath is not None:
             ss.addCalibRunInfo(CalibRunInfo(calibinfopath))
@@ -396,17 +445,16 @@ class ScanSet(DataItemSet, Loadable):
             :obj:`Scan`
                 Scan object representing combined image.
         """
-        selectedscans = self.getSelectedScans()
+        selectedscans = self.getSelected()
         if len(selectedscans)==0:
             logger.debug("No scans selected.")
             dims = self.imgdims if self.imgdims is not None else self.DEFAULT_IMGDIMS
             return Scan(np.zeros(dims))
         else:
             if not imgkwargs: imgkwargs = {}
-            selectedscans = iter(selectedscans)
-            i = next(selectedscans).getImg(**imgkwargs).copy()
+            i = np.zeros(selectedscans[0].dims, dtype=np.float64)
             for s in selectedscans:
-                i += s.getImg(**imgkwargs)
+                np.add(i, s.getImg(**imgkwargs), out=i)
             return Scan(i)
 
     def addCalibRunInfo(self, runinfo):
@@ -13,7 +13,9 @@ class Signal:
     """
 
     def __init__(self):
-        self.listeners = []
+        # Stored as a tuple, rebuilt on (dis)connect, since emitting is far
+        # more frequent than changing listeners
+        self.listeners = ()
 
     def connect(self, f):
         """Connects a listener callable.
@@ -23,7 +25,7 @@ class Signal:
         f : :obj:`callable`
             The listener to connect to the signal.
         """
-        self.listeners.append(f)
+        self.listeners = self.listeners + (f,)
 
     def disconnect(self, f):
         """Disconnect a listener callable.
@@ -33,7 +35,9 @@ class Signal:
         f : :obj:`callable`
             The listener to disconnect from the signal.
         """
-        self.listeners.remove(f)
+        listeners = list(self.listeners)
+        listeners.remove(f)
+        self.listeners = tuple(listeners)
 
     def emit(self, *args, **kwargs):
         """Emit the signal.
@@ -47,5 +51,23 @@ class Signal:
         **kwargs
             Keyword arguments to send to listeners.
         """
+        if kwargs:
+            for f in self.listeners:
+                f(*args, **kwargs)
+        else:
+            for f in self.listeners:
+                f(*args)
+
+    def emit_fast(self, arg):
+        """Emit the signal with a single positional argument.
+
+        Cheaper than :obj:`emit` for signals emitted very often, such as
+        progress updates.
+
+        Parameters
+        ----------
+        arg
+            Argument to send to listeners.
+        """
         for f in self.listeners:
-            f(*args, **kwargs)
+            f(arg)
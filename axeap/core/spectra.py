@@ -1,8 +1,10 @@
 import numpy as np
+from pathlib import Path
 
-from .item import PathType, Saveable, Loadable, DataItemSet
+from .item import PathType, DataItem, Saveable, Loadable, DataItemSet
+from ._jit import HAVE_NUMBA, get_num_threads, parallel_lock
 
-class Spectra(Saveable, Loadable):
+class Spectra(DataItem, Saveable, Loadable):
     """
     Class representing a spectra, indicating intensity over a range of energies.
     """
@@ -11,7 +13,7 @@ class Spectra(Saveable, Loadable):
     LOAD_PATH_TYPE = PathType.FILE
     LOAD_FILE_EXTENTIONS = ['npy']
     SAVE_PATH_TYPE = PathType.FILE
-    SAVE_PATH_TYPE = ['npy']
+    SAVE_FILE_EXTENTIONS = ['npy']
 
     def __init__(self, energies, intensities):
         """
@@ -22,6 +24,7 @@ class Spectra(Saveable, Loadable):
         intensities : :obj:`numpy.ndarray`
             List of intensities corresponding to each energy.
         """
+        DataItem.__init__(self)
         self.energies = energies
         self.intensities = intensities
         self.name = repr(self)
@@ -63,14 +66,84 @@ class Spectra(Saveable, Loadable):
         return Spectra(vals[:,0], vals[:,1])
 
 
-class SpectraSet(DataItemSet):
+class SpectraSet(DataItemSet, Saveable, Loadable):
     ''':obj:`.core.item.DataItemSet` for :obj:`Spectra`.
     '''
+
+    TYPE_NAME = 'Spectra Set'
+    LOAD_PATH_TYPE = PathType.FILE
+    LOAD_FILE_EXTENTIONS = ['npz']
+    SAVE_PATH_TYPE = PathType.FILE
+    SAVE_FILE_EXTENTIONS = ['npz']
+
     def __init__(self, spectra=None, selection_default=True):
-        ItemSet.__init__(self, spectra, selection_default=selection_default)
+        DataItemSet.__init__(self, spectra, selection_default=selection_default)
+
+    def saveToPath(self, fpath):
+        """
+        Save all spectra in set to a single compressed NPZ file.
+
+        If all spectra share the same energies, they are stored once along with
+        a 2D array of intensities with one row per spectra. Otherwise the
+        energies and intensities of each spectra are stored separately.
+
+        Parameters
+        ----------
+        fpath : path
+            Path of file to which to save spectra.
+        """
+        energies = [np.asarray(s.energies) for s in self]
+        if len(self) > 0 and all(np.array_equal(e, energies[0]) for e in energies):
+            np.savez_compressed(fpath, energies=energies[0],
+                intensities=np.stack([s.intensities for s in self]))
+        else:
+            arrs = {}
+            for i, s in enumerate(self):
+                arrs[f'energies_{i}'] = s.energies
+                arrs[f'intensities_{i}'] = s.intensities
+            np.savez_compressed(fpath, **arrs)
+
+    def loadFromPath(fpath):
+        """
+        Load set of spectra from file written by :obj:`SpectraSet.saveToPath`.
+
+        Parameters
+        ----------
+        fpath : path
+            Path of file from which to load spectra.
+
+        Returns
+        -------
+        :obj:`SpectraSet`
+            Set of spectra loaded from file, in the order they were saved.
+        """
+        with np.load(Path(fpath)) as z:
+            if 'energies' in z:
+                energies = z['energies']
+                spectra = [Spectra(energies, i) for i in z['intensities']]
+            else:
+                spectra = [Spectra(z[f'energies_{i}'], z[f'intensities_{i}'])
+                    for i in range(len(z.files)//2)]
+        return SpectraSet(spectra)
 
 
-def calcSpectra(emap, image, evres=0.5, normalize=False):
+def _energyGrid(emap, valid, evres):
+    """Get energies spanning valid part of energy map in steps of evres.
+
+    Returns
+    -------
+    :obj:`tuple`
+        Minimum valid energy in map and array of energies starting from it.
+    """
+    minenergy = np.min(emap, initial=1000000, where=valid)
+    maxenergy = np.max(emap, initial=0, where=valid)
+    # Number of bins is computed directly since the length of an arange with
+    # a float step is subject to rounding
+    nbins = max(int(round((maxenergy-minenergy)/evres))+1, 0)
+    return minenergy, np.linspace(minenergy, minenergy+(nbins-1)*evres, nbins)
+
+
+def calcSpectra(emap, image, evres=0.5, normalize=False, energies=None):
     """
     Generates spectra from image and energy map.
 
@@ -84,38 +157,110 @@ def calcSpectra(emap, image, evres=0.5, normalize=False):
         Resolution of spectra in number of eVs.
     normalize : bool
         Normalize the spectra so peak has intensity 1.
+    energies : :obj:`numpy.ndarray`, optional
+        1D array of strictly increasing energies to calculate spectra at, not
+        necessarily evenly spaced. Each pixel's intensity is added to the
+        nearest energy, except for pixels more than half the spacing between
+        the first or last two energies beyond either end, which are left out.
+        A single energy covers a range ``evres`` wide. By default energies
+        span the energy map in steps of ``evres``.
 
     Returns
     -------
     :obj:`numpy.ndarray`
         2D array structured as list of energy-intensity pairs.
     """
-    minenergy = np.min(emap, initial=1000000, where=emap>0)
-    maxenergy = np.max(emap, initial=0, where=emap>0)
-    energies = np.arange(minenergy, maxenergy+evres, evres)
-    emapenergies = []
-    emapenergyweights = []
-    intensities = np.zeros(energies.shape)
-    for x in range(emap.shape[0]):
-        for y in range(emap.shape[1]):
-            energy = emap[x,y]
-            if energy<=0: continue  # Skip invalid regions of energy map
-            if isinstance(image, np.ma.MaskedArray):
-                if image.mask[x,y] == True: continue    # Skip masked region of image
-            emapenergies.append(energy)
-            emapenergyweights.append(image[x,y])
-            try:
-                intensities[round((energy-minenergy)/evres)] += image[x,y]
-            except Exception:
-                print("Error computing spectra. Issue with energymap?")
-                print("Energy assigned to pixel:", energy)
-                print("Minimum energy of emap:", minenergy)
-                print("Emap energy resolution", evres)
-                print(Exception)
-                return
-    intensities /= np.max(intensities) # Scale to range 0-1
-    hist_intensities,bin_edges = np.histogram(emapenergies, bins=len(energies),
-        range=(minenergy, maxenergy), weights=emapenergyweights)
-    if normalize: hist_intensities/=np.max(hist_intensities)
-    spectra = np.stack((energies, hist_intensities)).T
+    valid = emap>0  # Skip invalid regions of energy map
+    masked = isinstance(image, np.ma.MaskedArray)
+    if energies is not None:
+        energies = np.asarray(energies, dtype=float)
+        if energies.ndim != 1 or len(energies) == 0 or \
+                np.any(np.diff(energies) <= 0):
+            raise ValueError('Energies must be a non-empty 1D array of strictly increasing values.')
+        if masked:
+            valid &= ~np.ma.getmaskarray(image) # Skip masked region of image
+            image = image.data
+        # Skip pixels beyond the grid, taking the outer bins to be as wide as
+        # the spacing at each end
+        if len(energies) > 1:
+            lohalf, hihalf = np.diff(energies)[[0,-1]]/2
+        else:
+            lohalf = hihalf = evres/2
+        e = emap[valid]
+        inside = (e >= energies[0]-lohalf) & (e <= energies[-1]+hihalf)
+        # Bin edges are midway between energies
+        idx = np.searchsorted((energies[1:]+energies[:-1])/2, e[inside])
+        intensities = np.bincount(idx, weights=image[valid][inside],
+            minlength=len(energies))
+        if normalize: intensities /= np.max(intensities)
+        return np.stack((energies, intensities)).T
+    minenergy, energies = _energyGrid(emap, valid, evres)
+    nbins = len(energies)
+    # Multiply rather than divide for each pixel, keeping the arithmetic in the
+    # precision of the energy map so float32 maps aren't promoted to float64
+    ftype = np.result_type(emap.dtype, np.float32).type
+    minenergy, inv_res = ftype(minenergy), ftype(1.0/evres)
+    if HAVE_NUMBA:
+        # Compiled kernels bin each pixel in a single pass without temporaries.
+        # Imported here so Numba is only loaded once spectra are calculated.
+        from ._spectra_kernels import _accumulate, _accumulate_masked
+        with parallel_lock:
+            if masked:
+                intensities = _accumulate_masked(emap, image.data,
+                    np.ma.getmaskarray(image).view(np.uint8), minenergy,
+                    inv_res, nbins, get_num_threads())
+            else:
+                intensities = _accumulate(emap, np.asarray(image), minenergy,
+                    inv_res, nbins, get_num_threads())
+    else:
+        if masked:
+            valid &= ~np.ma.getmaskarray(image) # Skip masked region of image
+            image = image.data
+        # Bin each pixel to the nearest energy, weighted by its intensity
+        idx = np.rint((emap[valid]-minenergy)*inv_res).astype(np.intp)
+        np.clip(idx, 0, nbins-1, out=idx)
+        intensities = np.bincount(idx, weights=image[valid], minlength=nbins)
+    if normalize: intensities /= np.max(intensities)
+    spectra = np.stack((energies, intensities)).T
     return spectra
+
+
+def calcSpectraBatch(emap, images, evres=0.5, normalize=False):
+    """
+    Generates spectra from several images that share an energy map.
+
+    With Numba installed, the images are processed in parallel in a single
+    call, otherwise this is the same as calling :obj:`calcSpectra` on each.
+
+    Parameters
+    ----------
+    emap : :obj:`numpy.ndarray`
+        2D array of energy values.
+    images : :obj:`numpy.ndarray`
+        3D array of intensity values, a stack of 2D images each the same size
+        as emap.
+    evres : float
+        Resolution of spectra in number of eVs.
+    normalize : bool
+        Normalize each spectra so peak has intensity 1.
+
+    Returns
+    -------
+    :obj:`numpy.ndarray`
+        3D array with a 2D array of energy-intensity pairs for each image, all
+        over the same energies.
+    """
+    if not HAVE_NUMBA or np.ma.isMaskedArray(images):
+        return np.stack([calcSpectra(emap, img, evres, normalize)
+            for img in images])
+    valid = emap>0  # Skip invalid regions of energy map
+    minenergy, energies = _energyGrid(emap, valid, evres)
+    ftype = np.result_type(emap.dtype, np.float32).type
+    from ._spectra_kernels import _get_accumulate_batch
+    accumulate = _get_accumulate_batch()
+    with parallel_lock:
+        intensities = accumulate(emap, images, energies.astype(ftype),
+            ftype(1.0/evres))
+    if normalize: intensities /= np.max(intensities, axis=1, keepdims=True)
+    return np.stack((np.broadcast_to(energies, intensities.shape), intensities),
+        axis=-1)
@@ -4,6 +4,7 @@ not just inspecting data after experiments)"""
 import logging
 logger = logging.getLogger('axeap')
 
+import os
 from pathlib import Path
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
@@ -30,21 +31,25 @@ class ScanSetDirWatcher(FileSystemEventHandler):
         self.scanset = scanset
         self.dir = Path(dir) # Convert to Path in case dir is str
         self.is_calibration_run = calibration_mode
+        self._scan_exts = frozenset(e.lower() for e in Scan.LOAD_FILE_EXTENTIONS)
         self.observer = Observer()
         self.observer.schedule(self, self.dir, recursive=False)
 
 
     def on_any_event(self, event):
         # TODO: Catch file deletion events and remove corresponding SS scans
-        p = Path(event.src_path)
         if event.is_directory or event.event_type != 'created':
             return
-        extension = p.suffix.lstrip('.').lower()
-        if extension in Scan.FILE_EXTENTIONS:   # New scan added
+        # Filter on extension before doing any other work, since most events
+        # in a busy directory are for files that aren't scans
+        extension = os.path.splitext(event.src_path)[1][1:].lower()
+        if extension in self._scan_exts:   # New scan added
+            p = Path(event.src_path)
             logger.debug(f'New scan found: {p}')
-            s = Scan.loadFromFile(p)
-            self.scanset.addScan(s)
+            s = Scan.loadFromPath(p)
+            self.scanset.add(s)
         elif self.is_calibration_run and extension.isnumeric(): # Config file added
+            p = Path(event.src_path)
             logger.debug(f'Calibration run info file found: {p}')
             logger.debug(f'Quitting observerving {self.dir} since calibration run info file detected.')
             self.observer.stop()
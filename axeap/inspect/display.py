@@ -2,9 +2,26 @@ from ..core import (Scan, Spectra, ImageSpec, ROI, HROI, VROI, RectangleROI)
 from ..core.conventions import X, Y
 from ..utils import getCoordsFromImage
 
+import weakref
 import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.patches as pltpatches
+from matplotlib.collections import PatchCollection
+
+# Contiguous (y,x) copies of scan images, kept for as long as the scan is, so
+# repeated displays don't make imshow copy a strided transposed view each time
+_transposed = weakref.WeakKeyDictionary()
+
+
+def _getTransposedImg(scan):
+    img = scan.getImg()
+    cached = _transposed.get(scan)
+    # Scans return the same array while their image is unchanged, so a new
+    # array means the cached copy is out of date
+    if cached is None or cached[0] is not img:
+        cached = (img, np.ascontiguousarray(img.T))
+        _transposed[scan] = cached
+    return cached[1]
 
 
 def displayScan(scan, rois=None, ax=None, plotargs=None):
@@ -26,27 +43,28 @@ def displayScan(scan, rois=None, ax=None, plotargs=None):
         origin, cmap = 'lower', 'binary'
     else:
         plotargs = plotargs.copy()
-        origin = d.pop('origin') if 'origin' in plotargs else 'lower'
-        cmap = d.pop('cmap') if 'cmap' in plotargs else 'gray'
-    img = scan.getImg()
+        origin = plotargs.pop('origin') if 'origin' in plotargs else 'lower'
+        cmap = plotargs.pop('cmap') if 'cmap' in plotargs else 'gray'
+    img = _getTransposedImg(scan)
     #points = np.array(getCoordsFromImage(img))
     ax.set_xlim(0, scan.dims[X])
     ax.set_ylim(0, scan.dims[Y])
-    ax.imshow(img.swapaxes(0,1), origin=origin, cmap=cmap, **plotargs)
+    ax.imshow(img, origin=origin, cmap=cmap, **plotargs)
     #ax.scatter(points[:,0], points[:,1], s=3)
     if rois is not None:
-        #print('got ROIs', len(rois))
-        for roi in rois:
-            if isinstance(roi, HROI):
-                ax.add_patch(pltpatches.Rectangle( \
-                    (roi.lo,0), roi.hi-roi.lo, scan.dims[Y], color='r', alpha=0.2))
-            elif isinstance(roi, VROI):
-                ax.add_patch(pltpatches.Rectangle( \
-                    (0,roi.lo), scan.dims[X], roi.hi-roi.lo, color='r', alpha=0.2))
-            elif isinstance(roi, RectangleROI):
-                #print(roi)
-                ax.add_patch(pltpatches.Rectangle( \
-                    (roi.lox, roi.loy), roi.hix-roi.lox, roi.hiy-roi.loy, color='r', alpha=0.2))
+        # Draw all ROIs as a single collection instead of one artist each
+        hrois = HROI.toArrays(r for r in rois if isinstance(r, HROI))
+        vrois = VROI.toArrays(r for r in rois if isinstance(r, VROI))
+        rects = RectangleROI.toArrays(r for r in rois
+            if isinstance(r, RectangleROI))
+        patches = [pltpatches.Rectangle((lo,0), w, scan.dims[Y])
+            for lo, w in zip(hrois['lo'], hrois['hi']-hrois['lo'])]
+        patches += [pltpatches.Rectangle((0,lo), scan.dims[X], h)
+            for lo, h in zip(vrois['lo'], vrois['hi']-vrois['lo'])]
+        patches += [pltpatches.Rectangle((lox,loy), w, h)
+            for lox, loy, w, h in zip(rects['lox'], rects['loy'],
+                rects['hix']-rects['lox'], rects['hiy']-rects['loy'])]
+        ax.add_collection(PatchCollection(patches, color='r', alpha=0.2))
     #plt.show()
 
 def displaySpectra(spectra, ax=None, plotargs=None):
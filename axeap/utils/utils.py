@@ -5,8 +5,6 @@ string operations.
 """
 
 import numpy as np
-import random
-import re
 
 
 def getCoordsFromImage(image, area=None, subsample=None):
@@ -25,9 +23,9 @@ def getCoordsFromImage(image, area=None, subsample=None):
 
     Returns
     -------
-    :obj:`list`
-        List of points in the form (x,y,z) where x and y are the pixel position
-        and z is the pixel value.
+    :obj:`numpy.ndarray`
+        Array of points of shape (N,3), each in the form (x,y,z) where x and y
+        are the pixel position and z is the pixel value.
     """
 
     RANDOM_SEED = 1234  # Totally random, I assure you
@@ -44,15 +42,15 @@ def getCoordsFromImage(image, area=None, subsample=None):
         loy = area[0][1]
         hix = area[1][0]
         hiy = area[1][1]
-    coords = list()
-    for xval in range(int(np.ceil(lox)), int(np.ceil(hix))):
-        for yval in range(int(np.ceil(loy)), int(np.ceil(hiy))):
-            if image[xval][yval] != 0:
-                coords.append((xval, yval, image[xval][yval]))
+    lox, loy, hix, hiy = (int(np.ceil(v)) for v in (lox, loy, hix, hiy))
+    sub = np.asarray(image)[lox:hix, loy:hiy]
+    xs, ys = np.nonzero(sub)
+    coords = np.stack([xs+lox, ys+loy, sub[xs,ys]], axis=1)
     if subsample is None: return coords
     else:
-        random.seed(RANDOM_SEED)
-        return random.sample(coords, round(len(coords)*subsample))
+        rng = np.random.default_rng(RANDOM_SEED)
+        return coords[rng.choice(len(coords), round(len(coords)*subsample),
+            replace=False)]
 
 
 def linearoverlap(l1, l2):
@@ -117,22 +115,19 @@ def separateSpans(spans, buffer):
     :obj:`list`
         List of spans after being separated.
     """
-    spans = sorted(spans)
-    for s1 in range(len(spans)):
-        for s2 in range(len(spans)):
-            if s1==s2: continue
-            span1 = spans[s1]
-            span2 = spans[s2]
-
-            if span1[1]<span2[1] and (span2[0]-span1[1])<buffer:
-                midpt = (span2[0]+span1[1])/2
-                span1[1] = midpt-buffer/2
-                span2[0] = midpt+buffer/2
-            if span2[1]<span1[1] and (span1[0]-span2[1])<buffer:
-                midpt = (span1[0]+span2[1])/2
-                span2[1] = midpt-buffer/2
-                span1[0] = midpt+buffer/2
-    return spans
+    spans = np.array(spans, dtype=float).reshape(-1, 2)
+    spans = spans[np.lexsort((spans[:,1], spans[:,0]))]
+    # Sweep over spans sorted by start, separating each from the span with
+    # the furthest end so far. Spans lying within that span are left as is.
+    prev = spans[0] if len(spans) else None
+    for cur in spans[1:]:
+        if prev[1]<cur[1]:
+            if (cur[0]-prev[1])<buffer:
+                midpt = (cur[0]+prev[1])/2
+                prev[1] = midpt-buffer/2
+                cur[0] = midpt+buffer/2
+            prev = cur
+    return spans.tolist()
 
 
 def get_trailing_number(s, default=None):
@@ -153,5 +148,7 @@ def get_trailing_number(s, default=None):
     :obj:`int`
         Number extracted from end of string.
     """
-    m = re.search(r'\d+$', s)
-    return int(m.group()) if m else default
+    i = len(s)
+    while i > 0 and s[i-1].isdecimal():
+        i -= 1
+    return int(s[i:]) if i < len(s) else default
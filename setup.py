@@ -16,12 +16,14 @@ setup(
     install_requires=['numpy',
                       'pandas',
                       'pillow',
+                      'tifffile',
                       'scipy',
                       'scikit-learn',
                       'opencv-contrib-python-headless',
                       'matplotlib',
                       'watchdog'
                       ],
+    extras_require={'jit': ['numba']},
 
     classifiers=[
         'Development Status :: 1 - Planning',